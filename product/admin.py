@@ -1,5 +1,7 @@
 from django.contrib import admin
+from easy_thumbnails.fields import ThumbnailerImageField
 from . import models
+from .uploads import IngestedImageField
 
 
 class ThumbnailInline(admin.TabularInline):
@@ -9,6 +11,9 @@ class ThumbnailInline(admin.TabularInline):
 class ImageInline(admin.TabularInline):
     model = models.Image
     extra = 3
+    formfield_overrides = {
+        ThumbnailerImageField: {'form_class': IngestedImageField},
+    }
 
 
 
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ProductConfig(AppConfig):
     name = 'product'
+
+    def ready(self):
+        from . import lookups, feeds, ranking, derivatives, querycache
+        from .models import Catagory, Product, Promotion, Tag
+        querycache.watch(Tag, Promotion, Catagory, Product)
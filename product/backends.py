@@ -0,0 +1,123 @@
+from __future__ import unicode_literals
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+try:
+    from django.utils.six.moves import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+# Shared by every backend instance with the same LOCATION in this process
+_stores = {}
+_locks = {}
+
+
+class LRULocMemCache(BaseCache):
+    ''' Process local cache bounded by the pickled size of its values.
+    The least recently used entries are evicted first once MAX_BYTES
+    (an OPTIONS key, 16MB by default) would be exceeded.
+    '''
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    
+    def __init__(self, name, params):
+        super(LRULocMemCache, self).__init__(params)
+        self._max_bytes = int(params.get('OPTIONS', {}).get(
+            'MAX_BYTES', 16 * 1024 * 1024))
+        self._store = _stores.setdefault(name, {
+            'data': OrderedDict(), 
+            'bytes': 0
+        })
+        self._lock = _locks.setdefault(name, threading.Lock())
+    
+    def _delete(self, key):
+        expiry, value = self._store['data'].pop(key)
+        self._store['bytes'] -= len(value)
+    
+    def _get(self, key):
+        data = self._store['data']
+        if key not in data:
+            return None
+        expiry, value = data[key]
+        if expiry is not None and expiry <= time.time():
+            self._delete(key)
+            return None
+        # Mark as most recently used
+        del data[key]
+        data[key] = (expiry, value)
+        return value
+    
+    def _set(self, key, value, timeout):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self._max_bytes:
+            return False
+        data = self._store['data']
+        if key in data:
+            self._delete(key)
+        while data and self._store['bytes'] + len(pickled) > self._max_bytes:
+            self._delete(next(iter(data)))
+        data[key] = (self.get_backend_timeout(timeout), pickled)
+        self._store['bytes'] += len(pickled)
+        return True
+    
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            return self._set(key, value, timeout)
+    
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            value = self._get(key)
+        if value is None:
+            return default
+        return pickle.loads(value)
+    
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            self._set(key, value, timeout)
+    
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(value) + delta
+            expiry = self._store['data'][key][0]
+            timeout = None if expiry is None else expiry - time.time()
+            self._set(key, new_value, timeout)
+        return new_value
+    
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            return self._get(key) is not None
+    
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            if key in self._store['data']:
+                self._delete(key)
+    
+    def clear(self):
+        with self._lock:
+            self._store['data'].clear()
+            self._store['bytes'] = 0
+    
+    def size(self):
+        ''' Returns the pickled size in bytes of everything stored
+        '''
+        return self._store['bytes']
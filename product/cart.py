@@ -0,0 +1,87 @@
+from __future__ import unicode_literals
+
+from .models import Item
+from . import errors
+
+
+CART_SESSION_KEY = 'cart'
+
+
+class CartLine(object):
+    ''' An item in the cart checked against its current stock and price
+    '''
+    
+    def __init__(self, item, quantity):
+        self.item = item
+        self.quantity = quantity
+        self.price = item.price
+        self.total = item.price * quantity
+        self.available = item.stock >= quantity
+
+
+class Cart(object):
+    ''' Shopping cart kept in the session as {item_id: quantity}
+    '''
+    
+    def __init__(self, session):
+        self.session = session
+        self.quantities = session.get(CART_SESSION_KEY, {})
+    
+    def __len__(self):
+        return sum(self.quantities.values())
+    
+    def _save(self):
+        self.session[CART_SESSION_KEY] = self.quantities
+        self.session.modified = True
+    
+    def add(self, item_id, quantity=1):
+        key = str(item_id)
+        self.set(item_id, self.quantities.get(key, 0) + quantity)
+    
+    def set(self, item_id, quantity):
+        key = str(item_id)
+        if quantity > 0:
+            self.quantities[key] = quantity
+        else:
+            self.quantities.pop(key, None)
+        self._save()
+    
+    def remove(self, item_id):
+        self.set(item_id, 0)
+    
+    def clear(self):
+        self.quantities = {}
+        self._save()
+    
+    def lines(self):
+        ''' Validates the whole cart against stock and price in one query.
+        Items that no longer exist are dropped from the cart.
+        '''
+        if not self.quantities:
+            return []
+        items = (Item.objects
+            .select_related('product')
+            .filter(pk__in=[int(pk) for pk in self.quantities])
+            .order_by('pk'))
+        lines = [CartLine(item, self.quantities[str(item.pk)]) 
+            for item in items]
+        if len(lines) != len(self.quantities):
+            self.quantities = dict((str(line.item.pk), line.quantity) 
+                for line in lines)
+            self._save()
+        return lines
+    
+    def checkout(self, lines=None):
+        ''' Sells every line and empties the cart. Pass the lines already
+        shown to the customer to avoid reading the items again.
+        '''
+        if lines is None:
+            lines = self.lines()
+        for line in lines:
+            if not line.available:
+                raise errors.NotEnoughStockException(
+                    line.item.stock, line.quantity)
+        Item.objects.sell_many(dict(
+            (line.item, line.quantity) for line in lines))
+        self.clear()
+        return lines
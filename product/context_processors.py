@@ -0,0 +1,11 @@
+from . import lookups
+
+
+def catalogue(request):
+    ''' Exposes the cached tags and catagories to every template
+    '''
+    state = lookups.current()
+    return {
+        'tags': state['tags'],
+        'catagories': state['catagories'],
+    }
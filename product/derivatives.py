@@ -0,0 +1,89 @@
+from __future__ import unicode_literals
+import json
+
+from django.conf import settings
+from django.db.models import signals
+from django.dispatch import receiver
+from easy_thumbnails.files import ThumbnailerFieldFile
+from PIL import Image as PILImage
+
+from .models import Image
+
+
+JPEG = 'jpg'
+WEBP = 'webp'
+
+
+def widths():
+    return getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (320, 640, 960, 1280))
+
+
+def webp_supported():
+    PILImage.init()
+    return 'WEBP' in PILImage.SAVE
+
+
+def formats():
+    if webp_supported():
+        return (WEBP, JPEG)
+    return (JPEG,)
+
+
+def source_widths(picture):
+    ''' Returns the derivative widths that do not upscale the picture
+    '''
+    usable = [w for w in widths() if w < picture.width]
+    return usable or [picture.width]
+
+
+def derivative(picture, width, extension=JPEG):
+    ''' Returns (generating if needed) a thumbnail of the picture scaled
+    to the given width in the given format
+    '''
+    thumbnailer = ThumbnailerFieldFile(
+        picture.instance, 
+        picture.field, 
+        picture.name
+    )
+    thumbnailer.thumbnail_extension = extension
+    return thumbnailer.get_thumbnail({'size': (width, 0)})
+
+
+def derivatives(picture, extension=JPEG):
+    return [(width, derivative(picture, width, extension)) 
+        for width in source_widths(picture)]
+
+
+def srcset(pairs):
+    return ', '.join('%s %iw' % (url, width) for width, url in pairs)
+
+
+def generate(image):
+    ''' Generates every derivative of an Image and stores their URLs on it,
+    so that pages can render its srcsets without touching the files
+    '''
+    image.derivatives = json.dumps(dict(
+        (extension, [(width, thumb.url) 
+            for width, thumb in derivatives(image.picture, extension)])
+        for extension in formats()
+    ))
+    # A queryset update so that post_save is not sent again
+    Image.objects.filter(pk=image.pk).update(derivatives=image.derivatives)
+
+
+def pick(picture, css_width, density=1, extension=JPEG):
+    ''' Returns the derivative a browser would pick from the srcset for an
+    image shown at css_width pixels
+    '''
+    candidates = derivatives(picture, extension)
+    wanted = css_width * density
+    for width, thumb in candidates:
+        if width >= wanted:
+            return thumb
+    return candidates[-1][1]
+
+
+@receiver(signals.post_save, sender=Image)
+def generate_on_save(sender, instance, raw=False, **kwargs):
+    if instance.picture and not raw:
+        generate(instance)
@@ -0,0 +1,276 @@
+from __future__ import unicode_literals
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from xml.sax.saxutils import XMLGenerator
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.urlresolvers import reverse
+from django.db.models import Max, signals
+from django.dispatch import receiver
+from django.utils import six, timezone
+from django.utils.six.moves.urllib.parse import urljoin
+from django.utils.dateparse import parse_datetime
+
+from . import models
+
+
+# The catalogue feed (one row per Item) and the sitemap (one URL per
+# Product) are split into shards by primary key range. A run rewrites
+# only the shards holding items saved since the previous run (Item.created
+# is auto_now) or named in the CatalogueChange log, streaming rows
+# straight from the database into a temporary file that then replaces
+# the old shard.
+MANIFEST = 'manifest.json'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _root():
+    return settings.PRODUCT_FEED_ROOT
+
+
+def _shard_size():
+    return getattr(settings, 'PRODUCT_FEED_SHARD_SIZE', 1000)
+
+
+def _base_url():
+    base_url = getattr(settings, 'PRODUCT_FEED_BASE_URL', '').rstrip('/')
+    if not base_url:
+        # Sitemaps and feeds are read off site, so their URLs are absolute
+        raise ImproperlyConfigured('PRODUCT_FEED_BASE_URL is not set')
+    return base_url
+
+
+def absolute_url(path):
+    ''' Returns the public URL of a site path such as a MEDIA_URL one
+    '''
+    return urljoin(_base_url() + '/', path)
+
+
+def feed_name(shard):
+    return 'feed-%05i.xml' % shard
+
+
+def sitemap_name(shard):
+    return 'sitemap-%05i.xml' % shard
+
+
+@contextmanager
+def atomic_file(name):
+    ''' Yields a file to write that replaces `name` in the feed root only
+    once it has been written completely
+    '''
+    root = _root()
+    handle, temp = tempfile.mkstemp(dir=root, prefix='.tmp-')
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            yield out
+        os.chmod(temp, 0o644)
+        os.rename(temp, os.path.join(root, name))
+    except Exception:
+        os.remove(temp)
+        raise
+
+
+def _element(xml, name, value):
+    xml.startElement(name, {})
+    xml.characters(six.text_type(value))
+    xml.endElement(name)
+
+
+def _shard_range(shard):
+    return shard * _shard_size(), (shard + 1) * _shard_size()
+
+
+def write_feed_shard(shard):
+    ''' Writes one feed shard, returning the number of items in it
+    '''
+    low, high = _shard_range(shard)
+    rows = (models.Item.objects
+        .filter(pk__gte=low, pk__lt=high)
+        .order_by('pk')
+        .values_list('pk', 'product_id', 'product__name', 'size', 'price',
+            'RRP', 'stock', 'thumbnail__picture__picture')
+        .iterator())
+    count = 0
+    with atomic_file(feed_name(shard)) as out:
+        xml = XMLGenerator(out, 'utf-8')
+        xml.startDocument()
+        xml.startElement('items', {})
+        for pk, product_id, name, size, price, rrp, stock, picture in rows:
+            xml.startElement('item', {'id': six.text_type(pk)})
+            _element(xml, 'product', product_id)
+            _element(xml, 'name', name)
+            _element(xml, 'size', size)
+            _element(xml, 'price', price)
+            _element(xml, 'rrp', rrp)
+            _element(xml, 'stock', stock)
+            _element(xml, 'image',
+                absolute_url(default_storage.url(picture)) if picture else '')
+            xml.endElement('item')
+            count += 1
+        xml.endElement('items')
+        xml.endDocument()
+    return count
+
+
+def write_sitemap_shard(shard):
+    ''' Writes one sitemap shard, returning the number of products in it
+    '''
+    low, high = _shard_range(shard)
+    rows = (models.Product.objects
+        .filter(pk__gte=low, pk__lt=high)
+        .annotate(lastmod=Max('item__created'))
+        .order_by('pk')
+        .values_list('pk', 'created', 'lastmod')
+        .iterator())
+    count = 0
+    with atomic_file(sitemap_name(shard)) as out:
+        xml = XMLGenerator(out, 'utf-8')
+        xml.startDocument()
+        xml.startElement('urlset', {'xmlns': SITEMAP_NS})
+        for pk, created, lastmod in rows:
+            product = models.Product(pk=pk)
+            xml.startElement('url', {})
+            _element(xml, 'loc', absolute_url(product.get_absolute_url()))
+            _element(xml, 'lastmod', (lastmod or created).date().isoformat())
+            xml.endElement('url')
+            count += 1
+        xml.endElement('urlset')
+        xml.endDocument()
+    return count
+
+
+def write_sitemap_index(shards):
+    with atomic_file('sitemap.xml') as out:
+        xml = XMLGenerator(out, 'utf-8')
+        xml.startDocument()
+        xml.startElement('sitemapindex', {'xmlns': SITEMAP_NS})
+        for shard in sorted(shards):
+            xml.startElement('sitemap', {})
+            _element(xml, 'loc', absolute_url(reverse('feed_file', 
+                args=[sitemap_name(shard)])))
+            xml.endElement('sitemap')
+        xml.endElement('sitemapindex')
+        xml.endDocument()
+
+
+def read_manifest():
+    try:
+        with open(os.path.join(_root(), MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _all_shards(model):
+    last = model.objects.aggregate(last=Max('pk'))['last']
+    if last is None:
+        return set()
+    return set(range(last // _shard_size() + 1))
+
+
+def _changed_shards(since):
+    size = _shard_size()
+    items = set(models.Item.objects.filter(
+        created__gt=since).values_list('pk', 'product_id'))
+    # Catagory membership does not show in the feed or the sitemap
+    changes = models.CatalogueChange.objects.filter(
+        created__gt=since, catagory_id=None)
+    for product_id, item_id in changes.values_list('product_id', 'item_id'):
+        items.add((item_id, product_id))
+    changed_products = set(product_id for _, product_id in items
+        if product_id is not None)
+    # A product edit changes the feed rows of all of its items
+    items.update(models.Item.objects.filter(
+        product_id__in=changes.filter(item_id=None).values('product_id'))
+        .values_list('pk', 'product_id'))
+    feed = set(pk // size for pk, _ in items if pk is not None)
+    sitemap = set(pk // size for pk in changed_products)
+    return feed, sitemap
+
+
+def build(full=False):
+    ''' Rewrites the changed feed and sitemap shards, or all of them when
+    `full` is given or there has been no previous run. Returns the
+    shards written as (feed shards, sitemap shards).
+    '''
+    root = _root()
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    started = timezone.now()
+    manifest = read_manifest()
+    since = parse_datetime(manifest.get('last_run') or '')
+    if full or since is None:
+        feed = _all_shards(models.Item)
+        sitemap = _all_shards(models.Product)
+        stale = (set(manifest.get('feed', [])) - feed,
+            set(manifest.get('sitemap', [])) - sitemap)
+    else:
+        feed, sitemap = _changed_shards(since)
+        stale = (set(), set())
+
+    feed_shards = set(manifest.get('feed', [])) - stale[0]
+    sitemap_shards = set(manifest.get('sitemap', [])) - stale[1]
+    for shard in feed:
+        if write_feed_shard(shard):
+            feed_shards.add(shard)
+        else:
+            feed_shards.discard(shard)
+            stale[0].add(shard)
+    for shard in sitemap:
+        if write_sitemap_shard(shard):
+            sitemap_shards.add(shard)
+        else:
+            sitemap_shards.discard(shard)
+            stale[1].add(shard)
+    if sitemap or stale[1]:
+        write_sitemap_index(sitemap_shards)
+
+    with atomic_file(MANIFEST) as out:
+        out.write(json.dumps({
+            'last_run': started.isoformat(),
+            'feed': sorted(feed_shards),
+            'sitemap': sorted(sitemap_shards),
+        }).encode('utf-8'))
+    for names, shards in ((feed_name, stale[0]), (sitemap_name, stale[1])):
+        for shard in shards:
+            path = os.path.join(root, names(shard))
+            if os.path.exists(path):
+                os.remove(path)
+    # The ranking job reads the log too, but never further back than its
+    # daily full rebuild, so a day's worth is kept for it.
+    models.CatalogueChange.objects.filter(
+        created__lte=started - timedelta(days=1)).delete()
+    return sorted(feed), sorted(sitemap)
+
+
+def log_change(product_id=None, item_id=None):
+    models.CatalogueChange.objects.create(
+        product_id=product_id,
+        item_id=item_id
+    )
+
+
+@receiver(signals.post_save, sender=models.Product)
+@receiver(signals.post_delete, sender=models.Product)
+def log_product_change(sender, instance, **kwargs):
+    log_change(instance.pk)
+
+
+@receiver(signals.post_delete, sender=models.Item)
+def log_item_delete(sender, instance, **kwargs):
+    log_change(instance.product_id, instance.pk)
+
+
+@receiver(signals.post_save, sender=models.Thumbnail)
+@receiver(signals.post_delete, sender=models.Thumbnail)
+@receiver(signals.post_save, sender=models.Image)
+@receiver(signals.post_delete, sender=models.Image)
+def log_picture_change(sender, instance, **kwargs):
+    # Replacing the file of an Image moves the URL of any Thumbnail of it
+    log_change(item_id=instance.item_id)
@@ -0,0 +1,104 @@
+from __future__ import unicode_literals
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import signals
+from django.dispatch import receiver
+
+from . import models
+
+
+# Tags and catagories are tiny and change rarely, so every worker keeps
+# a full copy in memory. Workers compare their copy against a version
+# kept in the shared cache and reload only when it has changed. Versions
+# are random and simply overwritten, so shared backends without an
+# atomic incr() (such as the file based cache) lose no invalidations,
+# and a key evicted from the cache never comes back as a version a
+# worker already holds.
+VERSION_KEY = 'product:lookups:version'
+
+_lock = threading.Lock()
+_state = {
+    'version': None,
+    'tags': (),
+    'catagories': (),
+    'tag_colours': {},
+}
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _read(version):
+    tags = tuple(models.Tag.objects.order_by('word'))
+    return {
+        'version': version,
+        'tags': tags,
+        'catagories': tuple(models.Catagory.objects.order_by('name')),
+        'tag_colours': dict((tag.pk, tag.colour) for tag in tags),
+    }
+
+
+def _load(version):
+    state = _read(version)
+    with _lock:
+        _state.update(state)
+
+
+def current():
+    ''' Returns this worker's copy, reloading it if it is out of date
+
+    Inside a transaction the rows read may never be committed, so they
+    are returned without replacing the copy.
+    '''
+    version = _current_version()
+    if _state['version'] != version:
+        if connection.in_atomic_block:
+            return _read(version)
+        _load(version)
+    return _state
+
+
+def preload():
+    ''' Loads every Tag and Catagory into this worker's memory
+    '''
+    _load(_current_version())
+
+
+def invalidate():
+    ''' Moves the shared version on so that every worker reloads
+    '''
+    cache.set(VERSION_KEY, _new_version(), None)
+
+
+def get_tags():
+    return current()['tags']
+
+
+def get_catagories():
+    return current()['catagories']
+
+
+def get_tag_colours():
+    return current()['tag_colours']
+
+
+@receiver(signals.post_save, sender=models.Tag)
+@receiver(signals.post_delete, sender=models.Tag)
+@receiver(signals.post_save, sender=models.Catagory)
+@receiver(signals.post_delete, sender=models.Catagory)
+def invalidate_on_change(sender, using=None, **kwargs):
+    # Once committed, or a worker could reload the old rows under the new
+    # version and keep them
+    transaction.on_commit(invalidate, using=using)
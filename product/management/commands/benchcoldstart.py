@@ -0,0 +1,35 @@
+from __future__ import division
+
+from django.core.management.base import BaseCommand
+
+from spring_aura import warmup
+
+
+def median(timings):
+    ordered = sorted(timings)
+    return ordered[len(ordered) // 2]
+
+
+class Command(BaseCommand):
+    help = ('Compares the first request latency of fresh workers started '
+            'with and without SPRING_AURA_WARMUP.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=5)
+
+    def handle(self, *args, **options):
+        results = {'cold': [], 'warm': []}
+        # Alternated so that a busy machine slows both kinds alike
+        for _ in range(options['workers']):
+            for label, warm in (('cold', False), ('warm', True)):
+                results[label].append(warmup.probe_worker(warm))
+        for label in ('cold', 'warm'):
+            probes = results[label]
+            self.stdout.write('%-5s startup %7.1f ms  first request %7.1f ms'
+                ' (medians)' % (label, 
+                    median([p['startup'] for p in probes]) * 1000,
+                    median([p['first_request'] for p in probes]) * 1000))
+        cold, warm = [median([p['first_request'] for p in results[label]])
+            for label in ('cold', 'warm')]
+        self.stdout.write('Warm first requests take %.0f%% of cold ones' % (
+            warm / cold * 100))
@@ -0,0 +1,44 @@
+from __future__ import division
+import time
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+
+
+ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.signed_cookies',
+)
+
+
+class Command(BaseCommand):
+    help = ('Times writing and reading a cart session with each session '
+            'engine.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=500)
+        parser.add_argument('--lines', type=int, default=5)
+
+    def handle(self, *args, **options):
+        cart = dict((str(pk), 1) for pk in range(options['lines']))
+        for engine in ENGINES:
+            SessionStore = import_module(engine).SessionStore
+            write = read = 0
+            for _ in range(options['rounds']):
+                # Read each session straight back, as a bounded local
+                # cache would evict sessions written long ago.
+                start = time.time()
+                session = SessionStore()
+                session['cart'] = cart
+                session.save()
+                write += time.time() - start
+
+                start = time.time()
+                SessionStore(session_key=session.session_key)['cart']
+                read += time.time() - start
+                session.delete()
+            write /= options['rounds']
+            read /= options['rounds']
+            self.stdout.write('%-50s write %7.3f ms  read %7.3f ms' % (
+                engine, write * 1000, read * 1000))
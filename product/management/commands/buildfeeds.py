@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from product import feeds
+
+
+class Command(BaseCommand):
+    help = ('Rewrites the catalogue feed and sitemap shards that changed '
+            'since the last run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', default=False,
+            help='Rewrite every shard.')
+        parser.add_argument('--base-url', 
+            help='Public address of the site, such as https://example.com. '
+                 'Defaults to PRODUCT_FEED_BASE_URL.')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['base_url']:
+            overrides['PRODUCT_FEED_BASE_URL'] = options['base_url']
+        with override_settings(**overrides):
+            feed, sitemap = feeds.build(full=options['full'])
+        self.stdout.write('Wrote %i feed and %i sitemap shards' % (
+            len(feed), len(sitemap)))
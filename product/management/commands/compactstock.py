@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from product.models import StockEntry
+
+
+class Command(BaseCommand):
+    help = ('Removes stock ledger rows older than --days. Their totals '
+            'are already held in DailySales.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--batch', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        removed = 0
+        while True:
+            # Delete in bounded batches to keep each transaction short
+            pks = list(StockEntry.objects.filter(created__lt=cutoff)
+                .order_by('created')
+                .values_list('pk', flat=True)[:options['batch']])
+            if not pks:
+                break
+            StockEntry.objects.filter(pk__in=pks).delete()
+            removed += len(pks)
+        self.stdout.write('Compacted %i stock entries' % removed)
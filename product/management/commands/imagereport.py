@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from product import derivatives
+from product.models import Thumbnail
+
+
+class Command(BaseCommand):
+    help = ('Reports image bytes sent for a page of product thumbnails, '
+            'shipping originals versus responsive derivatives.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5,
+            help='Number of newest products on the page.')
+        parser.add_argument('--width', type=int, default=360,
+            help='Displayed image width in CSS pixels.')
+        parser.add_argument('--density', type=int, default=2,
+            help='Device pixel ratio.')
+
+    def handle(self, *args, **options):
+        thumbnails = (Thumbnail.objects
+            .select_related('picture', 'item__product')
+            .order_by('-item__product__created')[:options['products']])
+        extension = (derivatives.WEBP if derivatives.webp_supported()
+            else derivatives.JPEG)
+        eager = getattr(settings, 'PRODUCT_EAGER_IMAGES', 3)
+        before = after = deferred = 0
+        for position, thumbnail in enumerate(thumbnails, 1):
+            picture = thumbnail.picture.picture
+            chosen = derivatives.pick(picture, options['width'],
+                options['density'], extension)
+            before += picture.size
+            if position > eager:
+                deferred += chosen.size
+            else:
+                after += chosen.size
+            self.stdout.write('%-30s %9i -> %7i bytes (%s)' % (
+                thumbnail.item, picture.size, chosen.size, chosen.name))
+        self.stdout.write('Before: %i bytes on load' % before)
+        self.stdout.write('After:  %i bytes on load, %i lazy loaded' % (
+            after, deferred))
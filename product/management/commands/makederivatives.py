@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from product import derivatives
+from product.models import Image
+
+
+class Command(BaseCommand):
+    help = ('Generates the responsive derivatives of images saved before '
+            'they were made on upload.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', default=False,
+            help='Regenerate every image, not only those without any.')
+
+    def handle(self, *args, **options):
+        images = Image.objects.all()
+        if not options['all']:
+            images = images.filter(derivatives='')
+        count = 0
+        for image in images.iterator():
+            derivatives.generate(image)
+            count += 1
+        self.stdout.write('Generated derivatives for %i images' % count)
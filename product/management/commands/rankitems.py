@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from product import ranking
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the popular and deals rankings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', default=False,
+            help='Recompute every catagory, not only changed ones.')
+
+    def handle(self, *args, **options):
+        scopes = ranking.rebuild(full=options['full'])
+        self.stdout.write('Refreshed %i ranking scopes' % scopes)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 22:45
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import product.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_auto_20160828_2233'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sold', models.IntegerField(default=0)),
+                ('restocked', models.IntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product.Item')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('s', 'Sale'), ('r', 'Restock')], max_length=1)),
+                ('quantity', models.IntegerField(validators=[product.models.validate_non_zero])),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Date created')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product.Item')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysales',
+            unique_together=set([('item', 'day')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='dailysales',
+            index_together=set([('day', 'item', 'sold')]),
+        ),
+    ]
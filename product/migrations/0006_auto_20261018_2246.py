@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 22:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_auto_20261018_2245'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ranking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('p', 'Popular'), ('d', 'Deals'), ('%', 'Deals (percent)')], max_length=1)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('computed', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date computed')),
+                ('catagory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='product.Catagory')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product.Item')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='ranking',
+            index_together=set([('kind', 'catagory', 'rank')]),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 22:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_auto_20261018_2246'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.IntegerField(blank=True, null=True)),
+                ('item_id', models.IntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Date created')),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_cataloguechange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cataloguechange',
+            name='catagory_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -8,10 +8,12 @@ from django.dispatch import receiver
 from django.db.models import F
 import errors
 import json
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext_lazy as _
 from django.core.exceptions import ValidationError
 from easy_thumbnails.fields import ThumbnailerImageField
+from .querycache import CachedManager
 
 
 
@@ -30,6 +32,10 @@ class Tag(models.Model):
     word = models.CharField(max_length=10)
     created = models.DateTimeField('Date created', auto_now=True)
     colour = models.CharField(max_length=6, default='000000')
+    
+    objects = models.Manager()
+    cached = CachedManager()
+    
     def __str__(self):
         return self.word
         
@@ -61,6 +67,9 @@ class Promotion(models.Model):
     expires = models.DateTimeField('Date expires')
     params = models.CharField(max_length=1000) #JSON OBJECT
     
+    objects = models.Manager()
+    cached = CachedManager()
+    
     
     def __str__(self):
         return self.name
@@ -85,6 +94,9 @@ class Catagory(models.Model):
     name = models.CharField(max_length=200)
     description = models.CharField(max_length=1000)
     
+    objects = models.Manager()
+    cached = CachedManager()
+    
     
 class Product(models.Model):
     name = models.CharField(max_length=200)
@@ -92,12 +104,58 @@ class Product(models.Model):
     created = models.DateTimeField('Date created')
     tags = models.ManyToManyField(Tag, blank=True)
     catagories = models.ManyToManyField(Catagory, blank=True)
+    
+    objects = models.Manager()
+    cached = CachedManager()
 
     def __str__(self):
         return self.name
+    
+    def get_absolute_url(self):
+        return reverse('product_detail', args=[self.pk])
         
 
 
+class ItemManager(models.Manager):
+    
+    def _apply_stock(self, quantities, entry_type):
+        quantities = dict(quantities)
+        sign = -1 if entry_type == StockEntry.SALE else 1
+        now = timezone.now()
+        with transaction.atomic():
+            for item, num in quantities.items():
+                items = self.filter(pk=item.pk)
+                if entry_type == StockEntry.SALE:
+                    items = items.filter(stock__gte=num)
+                updated = items.update(
+                    stock=F('stock') + sign * num, 
+                    created=now
+                )
+                if not updated:
+                    stock = self.filter(pk=item.pk).values_list(
+                        'stock', flat=True).first()
+                    raise errors.NotEnoughStockException(stock or 0, num)
+            StockEntry.record([
+                StockEntry(
+                    item=item, 
+                    entry_type=entry_type, 
+                    quantity=num, 
+                    created=now
+                )
+                for item, num in quantities.items()
+            ])
+    
+    def sell_many(self, quantities):
+        ''' Sells several items at once, takes a dict of item: num
+        '''
+        self._apply_stock(quantities, StockEntry.SALE)
+    
+    def add_many(self, quantities):
+        ''' Restocks several items at once, takes a dict of item: num
+        '''
+        self._apply_stock(quantities, StockEntry.RESTOCK)
+
+
 class Item(models.Model):
     SMALL = 'sm'
     MEDIUM = 'md'
@@ -131,6 +189,8 @@ class Item(models.Model):
         blank=True,
     )
     
+    objects = ItemManager()
+    
     
     class Meta:
         unique_together = (("product", "size"),)
@@ -149,26 +209,157 @@ class Item(models.Model):
         return self.stock <= 0
     
     def sell(self, num=1):
-        if self.stock < num:
-            raise errors.NotEnoughStockException(self.stock, num)
-        else:
-            self.stock = F('stock') - num
-            self.save()
+        Item.objects._apply_stock({self: num}, StockEntry.SALE)
         
     def add(self, num):
-        self.stock = F('stock') + num
-        self.save()
+        Item.objects._apply_stock({self: num}, StockEntry.RESTOCK)
 
     def __str__(self):
         return self.product.name + '_' + self.size
         
 
+class StockEntry(models.Model):
+    ''' Append-only ledger of stock movements, one row per sale or restock
+    '''
+    SALE = 's'
+    RESTOCK = 'r'
+    TYPES_OF_ENTRY = (
+        (SALE, 'Sale'),
+        (RESTOCK, 'Restock')
+    )
+    
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    entry_type = models.CharField(max_length=1, choices=TYPES_OF_ENTRY)
+    quantity = models.IntegerField(validators=[validate_non_zero])
+    created = models.DateTimeField(
+        'Date created', 
+        default=timezone.now, 
+        db_index=True
+    )
+    
+    def __str__(self):
+        return '%s %s %i' % (self.item_id, self.entry_type, self.quantity)
+    
+    @classmethod
+    def record(cls, entries):
+        ''' Writes the entries and folds them into the daily totals.
+        Call inside the transaction that changes the stock.
+        '''
+        cls.objects.bulk_create(entries)
+        totals = {}
+        for entry in entries:
+            day = timezone.localtime(entry.created).date()
+            sold, restocked = totals.get((entry.item_id, day), (0, 0))
+            if entry.entry_type == cls.SALE:
+                sold += entry.quantity
+            else:
+                restocked += entry.quantity
+            totals[(entry.item_id, day)] = (sold, restocked)
+        for (item_id, day), (sold, restocked) in totals.items():
+            DailySales.add(item_id, day, sold, restocked)
+            
+
+class DailySales(models.Model):
+    ''' Per item, per day totals of the stock ledger. These are kept up to
+    date as entries are written and outlive compacted ledger rows.
+    '''
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    day = models.DateField()
+    sold = models.IntegerField(default=0)
+    restocked = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = (("item", "day"),)
+        # Covers popularity queries so they never touch the table itself
+        index_together = (("day", "item", "sold"),)
+    
+    @classmethod
+    def add(cls, item_id, day, sold, restocked):
+        rows = cls.objects.filter(item_id=item_id, day=day)
+        increment = {
+            'sold': F('sold') + sold, 
+            'restocked': F('restocked') + restocked
+        }
+        if rows.update(**increment):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(item_id=item_id, day=day, 
+                    sold=sold, restocked=restocked)
+        except IntegrityError:
+            rows.update(**increment)
+    
+    @classmethod
+    def popular(cls, since):
+        ''' Returns (item_id, sold) pairs since the given date, best first
+        '''
+        return (cls.objects.filter(day__gte=since)
+            .values_list('item')
+            .annotate(total=models.Sum('sold'))
+            .filter(total__gt=0)
+            .order_by('-total'))
+        
+
+class Ranking(models.Model):
+    ''' Precomputed top items, globally (no catagory) or per catagory
+    '''
+    POPULAR = 'p'
+    DEALS = 'd'
+    DEALS_PERCENT = '%'
+    KINDS_OF_RANKING = (
+        (POPULAR, 'Popular'),
+        (DEALS, 'Deals'),
+        (DEALS_PERCENT, 'Deals (percent)')
+    )
+    
+    kind = models.CharField(max_length=1, choices=KINDS_OF_RANKING)
+    catagory = models.ForeignKey(
+        Catagory, 
+        null=True, 
+        blank=True, 
+        on_delete=models.CASCADE
+    )
+    rank = models.PositiveIntegerField()
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    score = models.DecimalField(decimal_places=4, max_digits=14)
+    computed = models.DateTimeField('Date computed', default=timezone.now)
+    
+    class Meta:
+        index_together = (("kind", "catagory", "rank"),)
+    
+    def __str__(self):
+        return '%s #%i %s' % (self.kind, self.rank, self.item_id)
+
+
+class CatalogueChange(models.Model):
+    ''' Changes to the catalogue that Item.created cannot show, such as
+    deletions, edits to a product or its images, or a product joining or
+    leaving a catagory. Read by the feed builder and the ranking job.
+    '''
+    product_id = models.IntegerField(null=True, blank=True)
+    item_id = models.IntegerField(null=True, blank=True)
+    catagory_id = models.IntegerField(null=True, blank=True)
+    created = models.DateTimeField(
+        'Date created', 
+        default=timezone.now, 
+        db_index=True
+    )
+    
+    def __str__(self):
+        return '%s/%s' % (self.product_id, self.item_id)
+
+
 class Image(models.Model):
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
     picture = ThumbnailerImageField(upload_to=settings.SHOPPING_DIR)
+    # JSON OBJECT of extension: [[width, url], ...], filled in on save
+    derivatives = models.TextField(blank=True, default='', editable=False)
     
     def __str__(self):
         return self.picture.name
+    
+    def get_derivatives(self):
+        return json.loads(self.derivatives or '{}')
 
 
 class Thumbnail(models.Model):
@@ -208,6 +399,7 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     when corresponding `Image` object is deleted.
     """
     if instance.picture:
+        instance.picture.delete_thumbnails()
         if os.path.isfile(instance.picture.path):
             os.remove(instance.picture.path)
 
@@ -226,5 +418,6 @@ def auto_delete_file_on_change(sender, instance, **kwargs):
 
     new_file = instance.picture
     if not old_file == new_file:
+        old_file.delete_thumbnails()
         if os.path.isfile(old_file.path):
             os.remove(old_file.path)
\ No newline at end of file
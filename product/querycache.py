@@ -0,0 +1,146 @@
+from __future__ import unicode_literals
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.db import connections, models, transaction
+from django.db.models import signals
+
+
+# Results are keyed by their SQL and by the version of every table the
+# query reads. Once a save, delete or relation change to a watched model
+# commits, its table moves on to a new version, so stale entries are
+# never read again and simply age out of the cache. Queries reading any
+# table that is not watched, or run inside a transaction, bypass the
+# cache.
+#
+# Versions live in the default (shared) cache so that every worker sees
+# them, while results may sit in a process local cache. They are random
+# and overwritten rather than incremented, as the shared file based cache
+# has no atomic incr(), and an evicted version never comes back. Updates through
+# QuerySet.update() send no signals and do not invalidate.
+VERSION_KEY = 'product:querycache:table:%s'
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+_watched = set()
+
+
+def _result_cache():
+    return caches[getattr(settings, 'PRODUCT_QUERY_CACHE', 'default')]
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def stats():
+    ''' Returns the hits, misses and hit ratio seen by this worker
+    '''
+    with _lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': float(hits) / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    with _lock:
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def table_versions(tables):
+    keys = dict((VERSION_KEY % table, table) for table in tables)
+    versions = cache.get_many(keys.keys())
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return sorted((keys[key], version) for key, version in versions.items())
+
+
+def _bump_now(table):
+    cache.set(VERSION_KEY % table, uuid.uuid4().hex, None)
+
+
+def bump(table, using=None):
+    ''' Moves the table on to a new version once the current transaction
+    commits, or at once outside of one. A rolled back change keeps the
+    old version, and no other worker can cache the old rows under the new
+    version before the change is visible to it.
+    '''
+    transaction.on_commit(lambda: _bump_now(table), using=using)
+
+
+class CachedQuerySet(models.QuerySet):
+    ''' QuerySet whose results are served from the cache when possible
+    '''
+    
+    def _cache_key(self):
+        query = self.query.clone()
+        sql, params = query.get_compiler(self.db).as_sql()
+        tables = set(join.table_name for join in query.alias_map.values())
+        if not tables <= _watched:
+            return None
+        signature = '%s|%r|%s|%r' % (
+            self.db, params, sql, table_versions(tables))
+        digest = hashlib.md5(signature.encode('utf-8')).hexdigest()
+        return 'product:querycache:%s' % digest
+    
+    def _fetch_all(self):
+        # Rows read inside a transaction may be uncommitted or locked
+        if (self._result_cache is None 
+                and not self.query.select_for_update
+                and not connections[self.db].in_atomic_block):
+            try:
+                key = self._cache_key()
+            except EmptyResultSet:
+                key = None
+            if key is not None:
+                results = _result_cache().get(key)
+                if results is None:
+                    _count('misses')
+                    results = list(self.iterator())
+                    _result_cache().set(key, results)
+                else:
+                    _count('hits')
+                self._result_cache = results
+        super(CachedQuerySet, self)._fetch_all()
+
+
+class CachedManager(models.Manager.from_queryset(CachedQuerySet)):
+    pass
+
+
+def bump_on_change(sender, using=None, **kwargs):
+    bump(sender._meta.db_table, using)
+
+
+def bump_on_relation_change(sender, action, using=None, **kwargs):
+    if action.startswith('post_'):
+        bump(sender._meta.db_table, using)
+
+
+def watch(*models):
+    ''' Makes queries over the models' tables, and the tables of their
+    many-to-many relations, cacheable and invalidated on change
+
+    Only the watched models have receivers connected, so deleting any
+    other model keeps Django's fast delete path.
+    '''
+    for model in models:
+        _watched.add(model._meta.db_table)
+        signals.post_save.connect(bump_on_change, sender=model)
+        signals.post_delete.connect(bump_on_change, sender=model)
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            _watched.add(through._meta.db_table)
+            signals.m2m_changed.connect(bump_on_relation_change, 
+                sender=through)
@@ -0,0 +1,142 @@
+from __future__ import unicode_literals
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    ExpressionWrapper, F, FloatField, Max, Q, Sum, Value
+)
+from django.db.models import signals
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    CatalogueChange, Catagory, DailySales, Item, Product, Ranking
+)
+
+
+def _size():
+    return getattr(settings, 'PRODUCT_RANKING_SIZE', 20)
+
+
+def _popular_days():
+    return getattr(settings, 'PRODUCT_POPULAR_DAYS', 7)
+
+
+def _in_catagory(queryset, catagory, prefix=''):
+    if catagory is None:
+        return queryset
+    return queryset.filter(**{prefix + 'product__catagories': catagory})
+
+
+def popular(catagory=None):
+    since = timezone.localtime(timezone.now()).date() - timedelta(
+        days=_popular_days())
+    sales = DailySales.objects.filter(day__gte=since)
+    sales = _in_catagory(sales, catagory, 'item__')
+    totals = (sales.values_list('item')
+        .annotate(total=Sum('sold'))
+        .filter(total__gt=0)
+        .order_by('-total', 'item'))
+    return list(totals[:_size()])
+
+
+def deals(catagory=None, percent=False):
+    saving = F('RRP') - F('price')
+    if percent:
+        # A float literal, as SQLite stores whole decimals as integers
+        # and would otherwise divide them as integers
+        saving = saving * Value(100.0) / F('RRP')
+    items = (Item.objects.filter(stock__gt=0, RRP__gt=0)
+        .annotate(saving=ExpressionWrapper(saving, output_field=FloatField()))
+        .filter(saving__gt=0)
+        .order_by('-saving', 'pk'))
+    items = _in_catagory(items, catagory)
+    return list(items.values_list('pk', 'saving')[:_size()])
+
+
+def _store(kind, catagory, scored, now):
+    Ranking.objects.filter(kind=kind, catagory=catagory).delete()
+    Ranking.objects.bulk_create([
+        Ranking(kind=kind, catagory=catagory, rank=rank, item_id=item_id,
+            score=Decimal(str(score)).quantize(Decimal('0.0001')), computed=now)
+        for rank, (item_id, score) in enumerate(scored, 1)
+    ])
+
+
+def _refresh_scope(catagory, now):
+    _store(Ranking.POPULAR, catagory, popular(catagory), now)
+    _store(Ranking.DEALS, catagory, deals(catagory), now)
+    _store(Ranking.DEALS_PERCENT, catagory, deals(catagory, True), now)
+
+
+def rebuild(full=False):
+    ''' Recomputes the rankings and returns how many scopes were refreshed
+
+    Unless `full` is given or the last run was on an earlier day (when the
+    popularity window has moved on for everything), only the catagories
+    holding items changed since the last run, or gaining or losing
+    products since then, are recomputed. The global lists are recomputed
+    only when an item has changed or been deleted.
+    '''
+    now = timezone.now()
+    last_run = Ranking.objects.aggregate(last=Max('computed'))['last']
+    today = timezone.localtime(now).date()
+    if last_run is None or timezone.localtime(last_run).date() != today:
+        full = True
+
+    if full:
+        catagories = list(Catagory.objects.all())
+        scopes = [None] + catagories
+    else:
+        changed = Item.objects.filter(created__gt=last_run)
+        since = CatalogueChange.objects.filter(created__gt=last_run)
+        moved = since.filter(catagory_id__isnull=False)
+        catagories = list(Catagory.objects.filter(
+            Q(product__item__in=changed) 
+            | Q(pk__in=moved.values('catagory_id'))).distinct())
+        scopes = list(catagories)
+        # Sales and stock changes move Item.created on, deletions are
+        # logged, and catagory membership does not show in global lists
+        if (changed.exists() 
+                or since.filter(item_id__isnull=False).exists()):
+            scopes.insert(0, None)
+
+    with transaction.atomic():
+        for catagory in scopes:
+            _refresh_scope(catagory, now)
+    return len(scopes)
+
+
+def ranked(kind, catagory_id=None):
+    ''' Returns the stored ranking in a single indexed read
+    '''
+    return (Ranking.objects
+        .filter(kind=kind, catagory_id=catagory_id)
+        .select_related('item__product')
+        .order_by('rank'))
+
+
+@receiver(signals.m2m_changed, sender=Product.catagories.through)
+def log_catagory_membership(sender, instance, action, reverse, pk_set, 
+                            **kwargs):
+    if action == 'pre_clear':
+        # The cleared rows are gone by post_clear, so note them now
+        if reverse:
+            pairs = [(pk, instance.pk) for pk in 
+                instance.product_set.values_list('pk', flat=True)]
+        else:
+            pairs = [(instance.pk, pk) for pk in 
+                instance.catagories.values_list('pk', flat=True)]
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            pairs = [(pk, instance.pk) for pk in pk_set]
+        else:
+            pairs = [(instance.pk, pk) for pk in pk_set]
+    else:
+        return
+    CatalogueChange.objects.bulk_create([
+        CatalogueChange(product_id=product_id, catagory_id=catagory_id)
+        for product_id, catagory_id in pairs
+    ])
@@ -0,0 +1,36 @@
+from django import template
+from django.conf import settings
+
+from product import derivatives, models
+
+register = template.Library()
+
+
+DEFAULT_SIZES = ('(min-width: 1200px) 360px, (min-width: 992px) 293px, '
+    '(min-width: 768px) 220px, 100vw')
+
+
+@register.inclusion_tag('product/picture.html')
+def responsive_picture(image, position=1, sizes=DEFAULT_SIZES, alt=''):
+    ''' Renders a <picture> with WebP and JPEG srcsets for an Image or
+    Thumbnail. Images after the first PRODUCT_EAGER_IMAGES positions on a
+    page are marked for lazy loading.
+
+    Only the derivative URLs stored on the Image are used, so rendering
+    never generates files. An Image without them falls back to the
+    original picture.
+    '''
+    if isinstance(image, models.Thumbnail):
+        image = image.picture
+    eager = getattr(settings, 'PRODUCT_EAGER_IMAGES', 3)
+    stored = image.get_derivatives()
+    jpeg = stored.get(derivatives.JPEG, [])
+    webp = stored.get(derivatives.WEBP, [])
+    return {
+        'src': jpeg[0][1] if jpeg else image.picture.url,
+        'srcset': derivatives.srcset(jpeg),
+        'webp_srcset': derivatives.srcset(webp),
+        'sizes': sizes,
+        'alt': alt,
+        'lazy': int(position) > eager,
+    }
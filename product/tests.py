@@ -1,12 +1,36 @@
+import hashlib
+import json
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test import RequestFactory
+from PIL import Image as PILImage
+from PIL import ImageCms
+from django.core.urlresolvers import clear_url_caches, reverse
+from django.utils.module_loading import import_module
+from django.utils.six.moves import reload_module
 from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
-import models, errors
+import models, errors, lookups, ranking, derivatives
+from cart import Cart
+import querycache, feeds
+from backends import LRULocMemCache
+from uploads import RejectedUpload
+from admin import ImageInline
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.template import Context, Template, engines
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import signals
+from spring_aura import warmup
 
 
 #ABSTRACT CLASSES
@@ -56,7 +80,7 @@ class ImageAbstractTestCase(ItemAbstractTestCase):
             picture=mock_img,
             item=self.item
         )
-        self.fpath = settings.SHOPPING_DIR + settings.MEDIA_ROOT
+        self.fpath = os.path.join(settings.MEDIA_ROOT, settings.SHOPPING_DIR)
 
         
     def tearDown(self):
@@ -129,6 +153,51 @@ class ItemTestCase(ItemAbstractTestCase, TestCase):
         self.item.refresh_from_db()
         self.assertEqual(self.item.out_of_stock(), False)
 
+    def test_item_stock_ledger(self):
+        ''' Tests that selling and restocking are written to the ledger
+        and folded into the daily totals
+        '''
+        self.item.sell(3)
+        self.item.sell(2)
+        self.item.add(10)
+        entries = models.StockEntry.objects.filter(item=self.item)
+        self.assertEqual(entries.count(), 3)
+        daily = models.DailySales.objects.get(item=self.item)
+        self.assertEqual((daily.sold, daily.restocked), (5, 10))
+        since = timezone.now().date()
+        self.assertEqual(list(models.DailySales.popular(since)), 
+            [(self.item.pk, 5)])
+            
+    def test_item_stale_sell(self):
+        ''' Tests that selling through a stale instance cannot oversell
+        '''
+        stale = models.Item.objects.get(pk=self.item.pk)
+        self.item.sell(100)
+        with self.assertRaises(errors.NotEnoughStockException):
+            stale.sell(1)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.stock, 0)
+        self.assertEqual(models.StockEntry.objects.count(), 1)
+
+    def test_item_sell_many(self):
+        ''' Tests that bulk sales are all or nothing
+        '''
+        item2 = models.Item.objects.create(
+            stock=1,
+            RRP = 2.5,
+            product = self.product,
+            size = models.Item.MEDIUM
+        )
+        with self.assertRaises(errors.NotEnoughStockException):
+            models.Item.objects.sell_many({self.item: 10, item2: 2})
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.stock, 100)
+        self.assertEqual(models.StockEntry.objects.count(), 0)
+        models.Item.objects.sell_many({self.item: 10, item2: 1})
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.stock, 90)
+        self.assertEqual(models.StockEntry.objects.count(), 2)
+
     def test_item_str_fucntion(self):
         ''' Tests whether the __str__ function returns name
         '''
@@ -194,6 +263,56 @@ class ThumbnailTestCase(ImageAbstractTestCase, TestCase):
             self.thumbnail.refresh_from_db()
         
         
+    def test_thumbnail_responsive_picture(self):
+        ''' Tests that thumbnails render smaller derivatives with a srcset
+        '''
+        template = Template('{% load product_images %}'
+            '{% responsive_picture thumbnail position=4 %}')
+        thumbnail = models.Thumbnail.objects.select_related('picture').get(
+            pk=self.thumbnail.pk)
+        # The derivatives were made on save, rendering reads no files
+        with self.assertNumQueries(0):
+            html = template.render(Context({'thumbnail': thumbnail}))
+        self.assertIn('srcset=', html)
+        self.assertIn('loading="lazy"', html)
+        picture = self.image.picture
+        smallest = derivatives.derivative(picture, derivatives.widths()[0])
+        self.assertEqual(smallest.width, derivatives.widths()[0])
+        self.assertLess(smallest.size, picture.size)
+        if derivatives.webp_supported():
+            self.assertIn('image/webp', html)
+
+    def test_front_renders_thumbnail(self):
+        ''' Tests that the front page cards show the product thumbnails
+        '''
+        response = self.client.get(reverse('front'))
+        product = response.context['product_list'][0]
+        self.assertEqual(product.thumbnail, self.thumbnail)
+        jpeg = self.image.get_derivatives()[derivatives.JPEG]
+        self.assertContains(response, jpeg[0][1])
+        self.assertNotContains(response, 'placehold.it')
+
+    def test_front_thumbnail_served(self):
+        ''' Tests that the image a front page card points at is served
+        by the development urlconf
+        '''
+        html = self.client.get(reverse('front')).content.decode('utf-8')
+        src = html.split('<img src="')[1].split('"')[0]
+        self.assertTrue(src.startswith(settings.MEDIA_URL))
+        # The media URLs are only routed when the urlconf loads with DEBUG
+        urls = import_module(settings.ROOT_URLCONF)
+        try:
+            with self.settings(DEBUG=True):
+                reload_module(urls)
+            clear_url_caches()
+            response = self.client.get(src)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content)[:2], 
+                b'\xff\xd8')
+        finally:
+            reload_module(urls)
+            clear_url_caches()
+
     def test_thumbnail_picture_incorrect_product(self):
         ''' Test whether or not an incorrect image 
         can be assigned to the product as a thumbnail
@@ -246,4 +365,580 @@ class PromotionTestCase(ImageAbstractTestCase, TestCase):
 
 
 class TagTestCase(ImageAbstractTestCase, TestCase):
-    pass
\ No newline at end of file
+    pass
+
+
+class LookupCacheTestCase(ProductAbstractTestCase, TransactionTestCase):
+    def setUp(self):
+        ProductAbstractTestCase.setUp(self)
+        lookups.invalidate()
+        self.tag = models.Tag.objects.create(word='Soap', colour='ff0000')
+        self.product.catagories.create(
+            name="Test Catagory",
+            description="Test Catagory for test products"
+        )
+
+    def test_lookups_cached(self):
+        ''' Tests that a warm lookup cache does not touch the database
+        '''
+        lookups.current()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(lookups.get_tags()), 1)
+            self.assertEqual(len(lookups.get_catagories()), 1)
+            self.assertEqual(lookups.get_tag_colours()[self.tag.pk], 'ff0000')
+
+    def test_lookups_invalidated_on_save(self):
+        ''' Tests that saving a tag reloads the lookups
+        '''
+        lookups.current()
+        self.tag.colour = '00ff00'
+        self.tag.save()
+        self.assertEqual(lookups.get_tag_colours()[self.tag.pk], '00ff00')
+        models.Catagory.objects.all().delete()
+        self.assertEqual(len(lookups.get_catagories()), 0)
+
+    def test_lookups_reload_after_eviction(self):
+        ''' Tests that an evicted version key never comes back as a
+        version a worker already holds
+        '''
+        cache.delete(lookups.VERSION_KEY)
+        lookups.invalidate()
+        lookups.current()
+        cache.delete(lookups.VERSION_KEY)
+        self.tag.colour = '0000ff'
+        self.tag.save()
+        self.assertEqual(lookups.get_tag_colours()[self.tag.pk], '0000ff')
+
+    def test_lookups_invalidated_after_commit(self):
+        ''' Tests that the version only moves on once a change commits,
+        and that rows read inside a transaction are never kept
+        '''
+        lookups.current()
+        version = cache.get(lookups.VERSION_KEY)
+        with transaction.atomic():
+            self.tag.colour = '00ff00'
+            self.tag.save()
+            self.assertEqual(cache.get(lookups.VERSION_KEY), version)
+        self.assertNotEqual(cache.get(lookups.VERSION_KEY), version)
+        self.assertEqual(lookups.get_tag_colours()[self.tag.pk], '00ff00')
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                self.tag.colour = '0000ff'
+                self.tag.save()
+                # Another worker's change lands meanwhile
+                lookups.invalidate()
+                self.assertEqual(lookups.get_tag_colours()[self.tag.pk], 
+                    '0000ff')
+                raise IntegrityError()
+        self.assertEqual(lookups.get_tag_colours()[self.tag.pk], '00ff00')
+
+
+class FrontViewTestCase(ItemAbstractTestCase, TestCase):
+    def test_front_context(self):
+        ''' Tests that the front page gathers all of its lookups
+        '''
+        response = self.client.get(reverse('front'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['product_list']),
+            [self.product])
+        self.assertEqual(response.context['cart_lines'], [])
+        self.client.post(reverse('cart_add', args=[self.item.pk]), 
+            {'quantity': 500})
+        response = self.client.get(reverse('front'))
+        self.assertEqual([line.item for line in response.context['cart_lines']],
+            [self.item])
+        self.assertContains(response, 'Only 100 left')
+
+    def test_front_tag_badges(self):
+        ''' Tests that product cards show badges from the lookup cache
+        '''
+        tag = models.Tag.objects.create(word='Vegan', colour='00aa00')
+        self.product.tags.add(tag)
+        response = self.client.get(reverse('front'))
+        self.assertContains(response, 'background-color: #00aa00')
+        self.assertEqual(response.context['product_list'][0].badges, [tag])
+
+
+class RankingTestCase(ItemAbstractTestCase, TestCase):
+    def setUp(self):
+        ItemAbstractTestCase.setUp(self)
+        self.catagory = self.product.catagories.create(
+            name="Test Catagory",
+            description="Test Catagory for test products"
+        )
+        self.item2 = models.Item.objects.create(
+            stock=100,
+            RRP = 50.0,
+            price = 40.0,
+            product = self.product,
+            size = models.Item.MEDIUM
+        )
+        self.item.sell(5)
+        self.item2.sell(1)
+        ranking.rebuild()
+
+    def test_ranking_order(self):
+        ''' Tests popular, deals and percentage deals orderings
+        '''
+        def ranked(kind, catagory_id=None):
+            return [r.item_id for r in ranking.ranked(kind, catagory_id)]
+        order = [self.item.pk, self.item2.pk]
+        self.assertEqual(ranked(models.Ranking.POPULAR), order)
+        self.assertEqual(ranked(models.Ranking.DEALS), order[::-1])
+        self.assertEqual(ranked(models.Ranking.DEALS_PERCENT), order)
+        self.assertEqual(ranked(models.Ranking.POPULAR, self.catagory.pk), 
+            order)
+
+    def test_ranking_deals_percent_fraction(self):
+        ''' Tests that percentage savings are not rounded to whole numbers
+        '''
+        cheap = models.Item.objects.create(stock=10, RRP=3, price=2, 
+            product=self.product, size=models.Item.LARGE)
+        product2 = models.Product.objects.create(name='Test Product 2',
+            description='test test test ...', created=timezone.now())
+        dear = models.Item.objects.create(stock=10, RRP=300, price=199, 
+            product=product2, size=models.Item.LARGE)
+        scores = dict(ranking.deals(percent=True))
+        self.assertAlmostEqual(scores[cheap.pk], 100.0 / 3)
+        self.assertAlmostEqual(scores[dear.pk], 10100.0 / 300)
+        ranked = [pk for pk, _ in ranking.deals(percent=True)]
+        self.assertLess(ranked.index(dear.pk), ranked.index(cheap.pk))
+
+    def test_ranking_deleted_item(self):
+        ''' Tests that deleting an item refreshes the global lists
+        '''
+        self.item2.delete()
+        self.assertEqual(ranking.rebuild(), 1)
+        self.assertEqual([r.item_id for r in 
+            ranking.ranked(models.Ranking.DEALS)], [self.item.pk])
+
+    def test_ranking_incremental(self):
+        ''' Tests that only catagories with changed items are refreshed
+        '''
+        self.assertEqual(ranking.rebuild(), 0)
+        self.item2.sell(10)
+        self.assertEqual(ranking.rebuild(), 2)
+        self.assertEqual(
+            ranking.ranked(models.Ranking.POPULAR, self.catagory.pk)[0].item,
+            self.item2)
+
+    def test_ranking_catagory_membership(self):
+        ''' Tests that catagories gaining or losing products refresh
+        '''
+        self.assertEqual(ranking.rebuild(), 0)
+        catagory2 = models.Catagory.objects.create(
+            name="Test Catagory 2",
+            description="Blah Blah"
+        )
+        catagory2.product_set.add(self.product)
+        self.assertEqual(ranking.rebuild(), 1)
+        self.assertEqual(
+            len(ranking.ranked(models.Ranking.POPULAR, catagory2.pk)), 2)
+        self.product.catagories.clear()
+        self.assertEqual(ranking.rebuild(), 2)
+        self.assertEqual(
+            len(ranking.ranked(models.Ranking.POPULAR, self.catagory.pk)), 0)
+
+    def test_ranking_view(self):
+        ''' Tests that the ranking page is served from one query
+        '''
+        lookups.preload()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('ranking', args=['deals']))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('ranking', args=['nonsense']))
+        self.assertEqual(response.status_code, 404)
+
+
+class CartTestCase(ItemAbstractTestCase, TestCase):
+    def setUp(self):
+        ItemAbstractTestCase.setUp(self)
+        self.item2 = models.Item.objects.create(
+            stock=1,
+            RRP = 50.0,
+            product = self.product,
+            size = models.Item.MEDIUM
+        )
+        self.cart = Cart(SessionStore())
+
+    def test_cart_lines_single_query(self):
+        ''' Tests that the whole cart is validated in one query
+        '''
+        self.cart.add(self.item.pk, 2)
+        self.cart.add(self.item2.pk, 2)
+        with self.assertNumQueries(1):
+            lines = self.cart.lines()
+            self.assertEqual(lines[0].total, self.item.price * 2)
+            self.assertEqual(lines[0].item.product, self.product)
+        self.assertEqual([line.available for line in lines], [True, False])
+        self.assertEqual(len(self.cart), 4)
+
+    def test_cart_checkout(self):
+        ''' Tests checkout sells the lines and empties the cart
+        '''
+        self.cart.add(self.item.pk, 3)
+        self.cart.add(self.item2.pk)
+        self.cart.checkout()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.stock, 97)
+        self.assertEqual(len(self.cart), 0)
+        self.cart.add(self.item2.pk)
+        with self.assertRaises(errors.NotEnoughStockException):
+            self.cart.checkout()
+
+    def test_cart_views(self):
+        ''' Tests the cart survives between requests in the session
+        '''
+        self.client.post(reverse('cart_add', args=[self.item.pk]), 
+            {'quantity': 2})
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['total'], self.item.price * 2)
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.stock, 98)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(list(response.context['lines']), [])
+
+
+CACHED_TEMPLATES = [dict(settings.TEMPLATES[0], OPTIONS=dict(
+    settings.TEMPLATES[0]['OPTIONS'], loaders=[
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]))]
+
+
+class WarmUpTestCase(TransactionTestCase):
+    @override_settings(TEMPLATES=CACHED_TEMPLATES)
+    def test_warm_up_phases(self):
+        ''' Tests that every phase runs, the synthetic request succeeds
+        and the cached loader holds the parsed templates
+        '''
+        from spring_aura import wsgi
+        timings = warmup.warm_up(wsgi.application)
+        self.assertEqual([name for name, _ in timings], ['imaging', 
+            'url_resolvers', 'templates', 'model_metadata', 'database', 
+            'lookups', 'synthetic_request'])
+        loader = engines['django'].engine.template_loaders[0]
+        for name in warmup.TEMPLATES:
+            self.assertIn(name, loader.get_template_cache)
+        self.assertEqual(warmup.synthetic_request(wsgi.application), '200 OK')
+
+    def test_warm_up_failure_logged(self):
+        ''' Tests that a failing phase does not stop the warm-up
+        '''
+        from spring_aura import wsgi
+        load_lookups = warmup.load_lookups
+        def fail():
+            raise DatabaseError('no such table: product_tag')
+        warmup.load_lookups = fail
+        try:
+            timings = warmup.warm_up(wsgi.application)
+        finally:
+            warmup.load_lookups = load_lookups
+        names = [name for name, _ in timings]
+        self.assertNotIn('lookups', names)
+        self.assertIn('synthetic_request', names)
+
+
+class QueryCacheTestCase(ProductAbstractTestCase, TransactionTestCase):
+    def setUp(self):
+        ProductAbstractTestCase.setUp(self)
+        caches[settings.PRODUCT_QUERY_CACHE].clear()
+        querycache.reset_stats()
+
+    def test_cached_queryset(self):
+        ''' Tests that a repeated query is served without the database
+        '''
+        list(models.Product.cached.filter(name='Test Product'))
+        with self.assertNumQueries(0):
+            products = list(models.Product.cached.filter(name='Test Product'))
+        self.assertEqual(products, [self.product])
+        self.assertEqual(querycache.stats()['hit_ratio'], 0.5)
+
+    def test_cached_queryset_invalidation(self):
+        ''' Tests that saves and relation changes invalidate results
+        '''
+        by_catagory = lambda: list(models.Product.cached.filter(
+            catagories__name='Test Catagory'))
+        self.assertEqual(by_catagory(), [])
+        self.product.catagories.create(
+            name="Test Catagory",
+            description="Test Catagory for test products"
+        )
+        self.assertEqual(by_catagory(), [self.product])
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.assertEqual(by_catagory()[0].name, 'Renamed')
+        self.product.catagories.clear()
+        self.assertEqual(by_catagory(), [])
+
+    def test_rolled_back_change_not_cached(self):
+        ''' Tests that uncommitted rows are never cached and that a rolled
+        back change keeps the committed results
+        '''
+        by_name = lambda: list(models.Product.cached.values_list(
+            'name', flat=True))
+        self.assertEqual(by_name(), ['Test Product'])
+        version = querycache.table_versions(['product_product'])
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                self.product.name = 'Uncommitted'
+                self.product.save()
+                self.assertEqual(by_name(), ['Uncommitted'])
+                raise IntegrityError()
+        self.assertEqual(querycache.table_versions(['product_product']), 
+            version)
+        with self.assertNumQueries(0):
+            self.assertEqual(by_name(), ['Test Product'])
+
+    def test_only_catalogue_models_watched(self):
+        ''' Tests that other models keep the fast delete path and that
+        queries joining their tables are not cached
+        '''
+        for model in (models.StockEntry, models.DailySales, models.Ranking):
+            self.assertFalse(signals.post_delete.has_listeners(model))
+        list(models.Product.cached.filter(item__stock__gt=0))
+        list(models.Product.cached.filter(item__stock__gt=0))
+        self.assertEqual(querycache.stats()['hits'], 0)
+
+    def test_lru_eviction(self):
+        ''' Tests that the local cache stays within its byte limit and
+        evicts the least recently used entry first
+        '''
+        lru = LRULocMemCache('test-lru', {'OPTIONS': {'MAX_BYTES': 300}})
+        lru.clear()
+        lru.set('a', 'x' * 100)
+        lru.set('b', 'x' * 100)
+        lru.get('a')
+        lru.set('c', 'x' * 100)
+        self.assertLessEqual(lru.size(), 300)
+        self.assertIsNone(lru.get('b'))
+        self.assertIsNotNone(lru.get('a'))
+        self.assertIsNotNone(lru.get('c'))
+
+
+class FeedTestCase(ImageAbstractTestCase, TestCase):
+    def setUp(self):
+        ImageAbstractTestCase.setUp(self)
+        self.root = tempfile.mkdtemp()
+        self.override = override_settings(PRODUCT_FEED_ROOT=self.root, 
+            PRODUCT_FEED_SHARD_SIZE=2, 
+            PRODUCT_FEED_BASE_URL='http://testserver')
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.root)
+        ImageAbstractTestCase.tearDown(self)
+
+    def read(self, name):
+        with open(os.path.join(self.root, name)) as f:
+            return f.read()
+
+    def test_feed_full_build(self):
+        ''' Tests that a first run writes every shard and the sitemap
+        '''
+        models.Thumbnail.objects.create(picture=self.image, item=self.item)
+        feed, sitemap = feeds.build()
+        self.assertEqual(feed, [self.item.pk // 2])
+        shard = self.read(feeds.feed_name(self.item.pk // 2))
+        self.assertIn('<price>2.50</price>', shard)
+        self.assertIn('<image>http://testserver/media/%s</image>' % 
+            self.image.picture.name, shard)
+        self.assertIn('<loc>http://testserver/product/%i/</loc>' % 
+            self.product.pk, 
+            self.read(feeds.sitemap_name(self.product.pk // 2)))
+        self.assertIn('<loc>http://testserver/feeds/%s</loc>' % 
+            feeds.sitemap_name(self.product.pk // 2), 
+            self.read('sitemap.xml'))
+
+    def test_feed_incremental_build(self):
+        ''' Tests that later runs only rewrite changed shards
+        '''
+        feeds.build()
+        self.assertEqual(feeds.build(), ([], []))
+        self.item.sell(10)
+        feed, sitemap = feeds.build()
+        self.assertEqual(feed, [self.item.pk // 2])
+        self.assertIn('<stock>90</stock>', 
+            self.read(feeds.feed_name(self.item.pk // 2)))
+        shard = feeds.feed_name(self.item.pk // 2)
+        self.item.delete()
+        feeds.build()
+        self.assertFalse(os.path.exists(os.path.join(self.root, shard)))
+
+    def test_feed_picture_replaced(self):
+        ''' Tests that replacing the file of a thumbnail's image rewrites
+        the item's feed shard with the new URL
+        '''
+        models.Thumbnail.objects.create(picture=self.image, item=self.item)
+        feeds.build()
+        self.image.picture = SimpleUploadedFile(
+            name='__test_image__replaced.jpg', 
+            content=open('images/soap__large.jpg', 'rb').read(), 
+            content_type='image/jpeg'
+        )
+        self.image.save()
+        feed, sitemap = feeds.build()
+        self.assertEqual(feed, [self.item.pk // 2])
+        self.assertIn('__test_image__replaced', 
+            self.read(feeds.feed_name(self.item.pk // 2)))
+
+    def test_sitemap_index_served(self):
+        ''' Tests that every sitemap in the index is served at its URL
+        '''
+        feeds.build()
+        index = self.read('sitemap.xml')
+        locs = [loc.split('</loc>')[0] for loc in index.split('<loc>')[1:]]
+        self.assertTrue(locs)
+        for loc in locs:
+            response = self.client.get(loc.replace('http://testserver', ''))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'<urlset', b''.join(response.streaming_content))
+
+
+_UPLOAD_PROBE = """
+import json, resource, sys, threading
+import django
+django.setup()
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from PIL import Image
+
+def upload():
+    with open(sys.argv[1], 'rb') as f:
+        request = RequestFactory().post('/', {'picture': f})
+    uploads.append(request.FILES['picture'])
+
+uploads = []
+threads = [threading.Thread(target=upload) for _ in range(int(sys.argv[2]))]
+with override_settings(PRODUCT_UPLOAD_MAX_DIMENSION=1024):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+print(json.dumps({
+    'growth': growth * 1024,
+    'uploads': [(u.sha1, u.original_size, Image.open(u).size) 
+        for u in uploads],
+}))
+"""
+
+
+@override_settings(PRODUCT_UPLOAD_MAX_DIMENSION=1024)
+class ImageUploadTestCase(TestCase):
+    WIDTH, HEIGHT = 8000, 6000
+
+    @classmethod
+    def setUpClass(cls):
+        super(ImageUploadTestCase, cls).setUpClass()
+        # Drawn in another process so that its memory does not count here
+        handle, cls.path = tempfile.mkstemp(suffix='.jpg')
+        os.close(handle)
+        subprocess.check_call([sys.executable, '-c',
+            'from PIL import Image; Image.new("RGB", (%i, %i), "green")'
+            '.save(%r, quality=90)' % (cls.WIDTH, cls.HEIGHT, cls.path)])
+        with open(cls.path, 'rb') as f:
+            cls.sha1 = hashlib.sha1(f.read()).hexdigest()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.path)
+        super(ImageUploadTestCase, cls).tearDownClass()
+
+    def upload(self):
+        with open(self.path, 'rb') as f:
+            request = RequestFactory().post('/', {'picture': f})
+        return request.FILES.get('picture')
+
+    def test_concurrent_uploads_memory_bounded(self):
+        ''' Tests that many large uploads at once are scaled down without
+        ever decoding the originals at full size
+        '''
+        # ru_maxrss never goes down, so it is measured in a fresh process
+        # that earlier tests have not already grown.
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='spring_aura.settings')
+        output = subprocess.check_output([sys.executable, '-c', 
+            _UPLOAD_PROBE, self.path, '8'], cwd=settings.BASE_DIR, env=env)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        # Decoding every original at full size would take this much
+        full_decode = 8 * self.WIDTH * self.HEIGHT * 3
+        self.assertLess(result['growth'], full_decode / 4)
+        self.assertEqual(len(result['uploads']), 8)
+        for sha1, original_size, size in result['uploads']:
+            self.assertEqual(sha1, self.sha1)
+            self.assertEqual(original_size, [self.WIDTH, self.HEIGHT])
+            self.assertEqual(size, [1024, 768])
+
+    def test_downscale_keeps_metadata(self):
+        ''' Tests that scaled uploads keep their EXIF orientation and
+        colour profile
+        '''
+        exif = PILImage.Exif()
+        exif[0x0112] = 6
+        profile = ImageCms.ImageCmsProfile(
+            ImageCms.createProfile('sRGB')).tobytes()
+        handle, path = tempfile.mkstemp(suffix='.jpg')
+        os.close(handle)
+        try:
+            PILImage.new('RGB', (4000, 3000), 'green').save(path, 
+                exif=exif.tobytes(), icc_profile=profile)
+            with open(path, 'rb') as f:
+                request = RequestFactory().post('/', {'picture': f})
+            upload = request.FILES['picture']
+        finally:
+            os.remove(path)
+        scaled = PILImage.open(upload)
+        self.assertEqual(scaled.size, (1024, 768))
+        self.assertEqual(scaled.getexif()[0x0112], 6)
+        self.assertEqual(scaled.info['icc_profile'], profile)
+
+    def test_oversize_upload_rejected(self):
+        ''' Tests that images with too many pixels are replaced by an
+        empty upload saying why
+        '''
+        with self.settings(PRODUCT_UPLOAD_MAX_PIXELS=1000000):
+            upload = self.upload()
+        self.assertIsInstance(upload, RejectedUpload)
+        self.assertEqual(upload.size, 0)
+        self.assertIn('more than 1000000 pixels', upload.rejection)
+
+    def test_rejected_upload_form_error(self):
+        ''' Tests that the admin image form reports a rejected upload
+        '''
+        request = RequestFactory().get('/')
+        request.user = User(is_superuser=True)
+        inline = ImageInline(models.Item, admin.site)
+        form = inline.get_formset(request).form
+        with self.settings(PRODUCT_UPLOAD_MAX_PIXELS=1000000):
+            data = form(files={'picture': self.upload()})
+        self.assertIn('This image was not accepted', 
+            ' '.join(data.errors['picture']))
+
+    def test_rejected_part_keeps_earlier_files(self):
+        ''' Tests that rejecting a file by its declared length leaves the
+        file before it in the same request open
+        '''
+        with open('images/soap__large.jpg', 'rb') as f:
+            content = f.read()
+        part = ('--B\r\nContent-Disposition: form-data; name="%s"; '
+            'filename="%s.jpg"\r\nContent-Type: image/jpeg\r\n%s\r\n')
+        body = b''.join([
+            (part % ('first', 'first', '')).encode('ascii'), content,
+            b'\r\n',
+            (part % ('second', 'second', 'Content-Length: %i\r\n' % (
+                len(content) * 2))).encode('ascii'), content, 
+            b'\r\n--B--\r\n',
+        ])
+        with self.settings(PRODUCT_UPLOAD_MAX_BYTES=len(content) + 1):
+            request = RequestFactory().generic('POST', '/', body, 
+                content_type='multipart/form-data; boundary=B')
+            files = request.FILES
+        self.assertIsInstance(files['second'], RejectedUpload)
+        self.assertFalse(files['first'].closed)
+        self.assertEqual(files['first'].read(), content)
@@ -0,0 +1,172 @@
+from __future__ import unicode_literals
+import hashlib
+import logging
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import (
+    TemporaryUploadedFile, UploadedFile
+)
+from django.core.files.uploadhandler import (
+    FileUploadHandler, StopFutureHandlers
+)
+from django.utils.translation import ugettext_lazy as _
+from PIL import Image as PILImage
+
+logger = logging.getLogger(__name__)
+
+
+# Enough to hold the headers (including EXIF) of any sensible image
+SNIFF_BYTES = 256 * 1024
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RejectedUpload(UploadedFile):
+    ''' Empty stand-in for an upload the ingest handler turned away, so
+    that form validation can say why
+    '''
+
+    def __init__(self, name, content_type, rejection):
+        super(RejectedUpload, self).__init__(BytesIO(), name, content_type, 0)
+        self.rejection = rejection
+
+
+class IngestedImageField(forms.ImageField):
+    ''' ImageField reporting uploads rejected by ImageIngestHandler
+    '''
+    default_error_messages = {
+        'rejected': _('This image was not accepted: %(reason)s.'),
+    }
+
+    def to_python(self, data):
+        if isinstance(data, RejectedUpload):
+            raise ValidationError(self.error_messages['rejected'],
+                code='rejected', params={'reason': data.rejection})
+        return super(IngestedImageField, self).to_python(data)
+
+
+class ImageIngestHandler(FileUploadHandler):
+    ''' Streams uploaded images to a temporary file in small chunks.
+
+    While streaming it hashes the upload and reads the image dimensions
+    from the first bytes, rejecting files over PRODUCT_UPLOAD_MAX_BYTES or
+    PRODUCT_UPLOAD_MAX_PIXELS as soon as that is known. The rest of a
+    rejected file is dropped as it arrives and a RejectedUpload takes its
+    place in request.FILES. Once complete, images wider or taller than
+    PRODUCT_UPLOAD_MAX_DIMENSION are scaled down, letting Pillow decode
+    JPEGs at a reduced size. Files that are not images are left to the
+    next handler.
+    '''
+    chunk_size = 64 * 1024
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        # The previous part's file is in request.FILES by now and must
+        # never be closed from here.
+        self.file = None
+        self.rejection = None
+        super(ImageIngestHandler, self).new_file(field_name, file_name,
+            content_type, content_length, charset, content_type_extra)
+        self.active = (content_type or '').startswith('image/')
+        if not self.active:
+            return
+        self.max_bytes = _setting('PRODUCT_UPLOAD_MAX_BYTES',
+            20 * 1024 * 1024)
+        if content_length and content_length > self.max_bytes:
+            self._reject('it is larger than %i bytes' % self.max_bytes)
+        else:
+            self.file = TemporaryUploadedFile(file_name, content_type, 0,
+                charset, content_type_extra)
+            self.sha1 = hashlib.sha1()
+            self.header = BytesIO()
+            self.image_size = None
+        raise StopFutureHandlers()
+
+    def _reject(self, reason):
+        logger.warning('Rejected upload %s: %s', self.file_name, reason)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.rejection = reason
+
+    def _sniff(self, raw_data):
+        self.header.seek(0, 2)
+        self.header.write(raw_data[:SNIFF_BYTES - self.header.tell()])
+        sniffed = self.header.tell()
+        self.header.seek(0)
+        try:
+            # Only reads the header, the pixels are not decoded
+            self.image_size = PILImage.open(self.header).size
+        except IOError:
+            if sniffed >= SNIFF_BYTES:
+                self._reject('it is not a readable image')
+            return
+        self.header = None
+        width, height = self.image_size
+        max_pixels = _setting('PRODUCT_UPLOAD_MAX_PIXELS', 50000000)
+        if width * height > max_pixels:
+            self._reject('at %ix%i it has more than %i pixels' % (
+                width, height, max_pixels))
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.rejection is None and start + len(raw_data) > self.max_bytes:
+            self._reject('it is larger than %i bytes' % self.max_bytes)
+        if self.rejection is not None:
+            return None
+        self.sha1.update(raw_data)
+        self.file.write(raw_data)
+        if self.image_size is None:
+            self._sniff(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if self.rejection is not None:
+            return RejectedUpload(self.file_name, self.content_type,
+                self.rejection)
+        self.file.seek(0)
+        self.file.size = file_size
+        upload = self.file
+        if self.image_size is not None:
+            upload = downscale(upload)
+        # Files too short to sniff are left to the form's image validation
+        upload.sha1 = self.sha1.hexdigest()
+        upload.original_size = self.image_size
+        return upload
+
+
+def downscale(upload):
+    ''' Returns the upload scaled to fit PRODUCT_UPLOAD_MAX_DIMENSION, or
+    the upload itself when it already fits
+    '''
+    limit = _setting('PRODUCT_UPLOAD_MAX_DIMENSION', 2048)
+    with open(upload.temporary_file_path(), 'rb') as source:
+        image = PILImage.open(source)
+        image_format = image.format
+        width, height = image.size
+        if max(width, height) <= limit:
+            return upload
+        # Kept so that rotated phone photos and wide gamut pictures show
+        # as taken. The derivatives honour the EXIF orientation too.
+        metadata = dict((key, image.info[key])
+            for key in ('exif', 'icc_profile') if image.info.get(key))
+        scale = float(limit) / max(width, height)
+        target = (max(1, int(width * scale)), max(1, int(height * scale)))
+        # For JPEGs this picks a DCT scale so that only about as many
+        # pixels as needed are ever decoded. Other formats ignore it.
+        image.draft(image.mode, target)
+        resized = image.resize(target, PILImage.ANTIALIAS)
+    scaled = TemporaryUploadedFile(upload.name, upload.content_type, 0,
+        upload.charset, upload.content_type_extra)
+    resized.save(scaled, format=image_format, quality=90, **metadata)
+    scaled.size = scaled.tell()
+    scaled.seek(0)
+    upload.close()
+    return scaled
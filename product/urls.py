@@ -3,6 +3,18 @@ from . import views
 
 urlpatterns = [
     url(r'^$', views.front, name='front'),   
+    url(r'^product/(?P<product_id>[0-9]+)/$', views.product_detail, 
+        name='product_detail'),
+    url(r'^rank/(?P<kind>[a-z-]+)/$', views.ranking_list, name='ranking'),
+    url(r'^rank/(?P<kind>[a-z-]+)/(?P<catagory_id>[0-9]+)/$', 
+        views.ranking_list, name='catagory_ranking'),
+    url(r'^cart/$', views.cart_detail, name='cart'),
+    url(r'^cart/add/(?P<item_id>[0-9]+)/$', views.cart_add, name='cart_add'),
+    url(r'^cart/remove/(?P<item_id>[0-9]+)/$', views.cart_remove, 
+        name='cart_remove'),
+    url(r'^cart/checkout/$', views.checkout, name='checkout'),
+    url(r'^feeds/(?P<name>[a-z0-9-]+\.xml)$', views.feed_file, 
+        name='feed_file'),
     #url(r'^template/$', views.front_template, name='front_template'),   
     #url(r'^(?P<item_id>[0-9]+)/$', views.item, name='item_detail')
 ]
\ No newline at end of file
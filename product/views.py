@@ -1,10 +1,118 @@
-from django.shortcuts import render
-from django.http import HttpResponse
-from .models import Product
+from django.conf import settings
+from django.shortcuts import render, redirect, get_object_or_404
+from django.views.static import serve
+from django.http import HttpResponse, Http404
+from django.contrib import messages
+from django.views.decorators.http import require_POST
+from .models import Product, Item, Ranking, Thumbnail
+from . import lookups, ranking, errors
+from .cart import Cart
+
+
+def front_products(count=5):
+    ''' Returns the newest products, each with the `thumbnail` of its first
+    item that has one (or None) and its `badges`, the Tags from the lookup
+    cache, in three queries
+    '''
+    products = list(Product.cached.order_by('-created')[:count])
+    thumbnails = {}
+    for thumbnail in (Thumbnail.objects
+            .filter(item__product__in=products)
+            .select_related('picture', 'item')
+            .order_by('item__pk')):
+        thumbnails.setdefault(thumbnail.item.product_id, thumbnail)
+    tags = dict((tag.pk, tag) for tag in lookups.get_tags())
+    badges = {}
+    for product_id, tag_id in (Product.tags.through.objects
+            .filter(product__in=products)
+            .values_list('product_id', 'tag_id')):
+        # A tag newer than this worker's copy shows from the next reload
+        if tag_id in tags:
+            badges.setdefault(product_id, []).append(tags[tag_id])
+    for product in products:
+        product.thumbnail = thumbnails.get(product.pk)
+        product.badges = sorted(badges.get(product.pk, []), 
+            key=lambda tag: tag.word)
+    return products
 
 
 def front(request):
-    product_list = Product.objects.order_by('-created')[:5]
-    context = {'product_list':product_list}
+    context = {
+        'product_list': front_products(),
+        'cart_lines': Cart(request.session).lines(),
+    }
     return render(request, 'product/index.html', context)
 
+
+def product_detail(request, product_id):
+    product = get_object_or_404(Product, pk=product_id)
+    context = {
+        'product': product,
+        'item_list': product.item_set.order_by('size'),
+    }
+    return render(request, 'product/detail.html', context)
+
+
+RANKING_KINDS = {
+    'popular': Ranking.POPULAR,
+    'deals': Ranking.DEALS,
+    'deals-percent': Ranking.DEALS_PERCENT,
+}
+
+
+def ranking_list(request, kind, catagory_id=None):
+    if kind not in RANKING_KINDS:
+        raise Http404("No such ranking")
+    context = {
+        'kind': kind,
+        'ranking_list': ranking.ranked(RANKING_KINDS[kind], catagory_id),
+    }
+    return render(request, 'product/ranking.html', context)
+
+
+def cart_detail(request):
+    cart = Cart(request.session)
+    lines = cart.lines()
+    context = {
+        'lines': lines,
+        'total': sum(line.total for line in lines),
+    }
+    return render(request, 'product/cart.html', context)
+
+
+@require_POST
+def cart_add(request, item_id):
+    item = get_object_or_404(Item, pk=item_id)
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except ValueError:
+        quantity = 1
+    Cart(request.session).add(item.pk, quantity)
+    return redirect('cart')
+
+
+@require_POST
+def cart_remove(request, item_id):
+    Cart(request.session).remove(item_id)
+    return redirect('cart')
+
+
+@require_POST
+def checkout(request):
+    cart = Cart(request.session)
+    try:
+        lines = cart.checkout()
+    except errors.NotEnoughStockException as e:
+        messages.error(request, str(e))
+        return redirect('cart')
+    context = {
+        'lines': lines,
+        'total': sum(line.total for line in lines),
+    }
+    return render(request, 'product/checkout.html', context)
+
+
+def feed_file(request, name):
+    # Small enough to serve from here, a front end server can map the
+    # same URL straight onto PRODUCT_FEED_ROOT instead.
+    return serve(request, name, document_root=settings.PRODUCT_FEED_ROOT)
@@ -55,17 +55,28 @@ MIDDLEWARE_CLASSES = [
 
 ROOT_URLCONF = 'spring_aura.urls'
 
+# Outside of development templates are parsed once per worker and kept
+template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    template_loaders = [
+        ('django.template.loaders.cached.Loader', template_loaders),
+    ]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': template_loaders,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'product.context_processors.catalogue',
             ],
         },
     },
@@ -85,6 +96,39 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+# The default cache holds the lookup and query cache versions, which every
+# worker must see. The file based cache shares them between the workers of
+# one host. Use memcached or similar once workers span several hosts.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    'querycache': {
+        'BACKEND': 'product.backends.LRULocMemCache',
+        'LOCATION': 'querycache',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_BYTES': 16 * 1024 * 1024,
+        },
+    },
+}
+
+# Cache alias holding the results of Model.cached querysets
+PRODUCT_QUERY_CACHE = 'querycache'
+
+
+# Sessions
+# https://docs.djangoproject.com/en/1.9/topics/http/sessions/
+# Sessions only hold the shopping cart, so they live in a signed cookie
+# rather than costing a database round trip on every request.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
 
@@ -124,6 +168,47 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 
+# Uploaded images and their derivatives. Served by Django only while
+# DEBUG is on, a front end server maps MEDIA_URL onto MEDIA_ROOT otherwise.
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_URL = '/media/'
+
+
 # Shopping image directory
 
-SHOPPING_DIR = 'product/images'
\ No newline at end of file
+SHOPPING_DIR = 'product/images'
+
+# Rankings kept per catagory and globally by `manage.py rankitems`
+
+PRODUCT_RANKING_SIZE = 20
+PRODUCT_POPULAR_DAYS = 7
+
+
+# Widths generated for responsive product images, and how many images at
+# the top of a page load eagerly before the rest are lazy loaded.
+
+PRODUCT_IMAGE_WIDTHS = (320, 640, 960, 1280)
+PRODUCT_EAGER_IMAGES = 3
+
+
+# Catalogue feed and sitemap shards written by `manage.py buildfeeds`,
+# served under /feeds/. Their URLs are absolute, starting with the site's
+# public address from PRODUCT_FEED_BASE_URL (or `buildfeeds --base-url`).
+
+PRODUCT_FEED_ROOT = os.path.join(BASE_DIR, 'feeds')
+PRODUCT_FEED_BASE_URL = os.environ.get('PRODUCT_FEED_BASE_URL', '')
+PRODUCT_FEED_SHARD_SIZE = 1000
+
+
+# Uploaded images are streamed to disk, checked and scaled down to
+# PRODUCT_UPLOAD_MAX_DIMENSION before they reach the Image model.
+
+FILE_UPLOAD_HANDLERS = [
+    'product.uploads.ImageIngestHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+PRODUCT_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+PRODUCT_UPLOAD_MAX_PIXELS = 50000000
+PRODUCT_UPLOAD_MAX_DIMENSION = 2048
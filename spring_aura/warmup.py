@@ -0,0 +1,175 @@
+"""
+Warm-up for freshly started workers.
+
+A new worker otherwise pays on its first requests for importing Pillow
+and easy_thumbnails, compiling the URL resolvers, parsing templates,
+building model metadata and connecting to the database. Setting the
+SPRING_AURA_WARMUP environment variable makes `spring_aura.wsgi` do all
+of this at import time, which happens before the server forks when it
+preloads the application.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.urlresolvers import get_resolver, reverse
+from django.db import connection, connections
+from django.template import engines
+from django.template.loader import get_template
+from django.template.loaders.cached import Loader as CachedLoader
+
+logger = logging.getLogger(__name__)
+
+
+TEMPLATES = (
+    'template.html',
+    'product/index.html',
+    'product/card.html',
+)
+
+
+def load_imaging():
+    from PIL import Image
+    Image.init()
+    import easy_thumbnails.engine
+    import easy_thumbnails.files
+    import easy_thumbnails.processors
+
+
+def load_url_resolvers():
+    get_resolver(None).url_patterns
+    reverse('front')
+
+
+def load_templates():
+    # Only the cached loader keeps what it parses, as it does with DEBUG off
+    cached = [loader for loader in engines['django'].engine.template_loaders
+        if isinstance(loader, CachedLoader)]
+    if not cached:
+        logger.info('Warm-up skips templates, the cached loader is off')
+        return
+    for name in TEMPLATES:
+        get_template(name)
+
+
+def load_model_metadata():
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.concrete_fields
+
+
+def connect_database():
+    connection.ensure_connection()
+
+
+def load_lookups():
+    from product import lookups
+    lookups.preload()
+
+
+def _host():
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+def synthetic_request(application):
+    ''' Sends a GET for the front page through the full WSGI stack and
+    returns the response status
+    '''
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': reverse('front'),
+        'QUERY_STRING': '',
+        'SERVER_NAME': _host(),
+        'SERVER_PORT': '80',
+        'HTTP_HOST': _host(),
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = application(environ, lambda s, headers, *a: status.append(s))
+    try:
+        for chunk in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return status[0]
+
+
+def warm_up(application):
+    ''' Runs the warm-up phases and returns a list of (phase, seconds)
+
+    A failing phase is logged and skipped, so that a database that is
+    down or not yet migrated never stops a worker from starting. Database
+    connections are closed afterwards so that forked workers never share
+    one.
+    '''
+    phases = [
+        ('imaging', load_imaging),
+        ('url_resolvers', load_url_resolvers),
+        ('templates', load_templates),
+        ('model_metadata', load_model_metadata),
+        ('database', connect_database),
+        ('lookups', load_lookups),
+        ('synthetic_request', lambda: logger.info(
+            'Warm-up request returned %s', synthetic_request(application))),
+    ]
+    timings = []
+    try:
+        for name, phase in phases:
+            start = time.time()
+            try:
+                phase()
+            except Exception:
+                logger.exception('Warm-up %s failed', name)
+                continue
+            timings.append((name, time.time() - start))
+            logger.info('Warm-up %s took %.1f ms', name, timings[-1][1] * 1000)
+    finally:
+        connections.close_all()
+    return timings
+
+
+_PROBE = """
+import json, time
+start = time.time()
+from spring_aura import wsgi, warmup
+startup = time.time() - start
+start = time.time()
+status = warmup.synthetic_request(wsgi.application)
+print(json.dumps({
+    'startup': startup,
+    'first_request': time.time() - start,
+    'status': status,
+}))
+"""
+
+
+def probe_worker(warm):
+    ''' Starts a fresh interpreter, imports the WSGI application with or
+    without warm-up and returns its startup and first request timings
+    '''
+    env = dict(os.environ)
+    env.pop('SPRING_AURA_WARMUP', None)
+    if warm:
+        env['SPRING_AURA_WARMUP'] = '1'
+    env['DJANGO_SETTINGS_MODULE'] = 'spring_aura.settings'
+    output = subprocess.check_output(
+        [sys.executable, '-c', _PROBE], cwd=settings.BASE_DIR, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
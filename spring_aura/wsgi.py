@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "spring_aura.settings")
 
 application = get_wsgi_application()
+
+# With SPRING_AURA_WARMUP set, load everything a first request would pay
+# for before the server forks its workers.
+if os.environ.get('SPRING_AURA_WARMUP'):
+    from spring_aura import warmup
+    warmup.warm_up(application)